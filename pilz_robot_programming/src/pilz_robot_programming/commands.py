@@ -19,6 +19,7 @@ from __future__ import absolute_import
 
 import rospy
 from tf import transformations
+from tf2_geometry_msgs import do_transform_pose
 from geometry_msgs.msg import Quaternion, Pose
 from geometry_msgs.msg import PoseStamped
 from pilz_msgs.msg import MoveGroupSequenceGoal, MotionSequenceRequest, MotionSequenceItem
@@ -81,17 +82,18 @@ class _AbstractCmd(object):
             return robot._FAILURE
 
         sequence_action_goal.planning_options = self._planning_options
+        sequence_client = robot._sequence_client
 
         rospy.logdebug("Sending goal.")
-        if not _AbstractCmd._locked_send_goal(robot, robot._sequence_client, sequence_action_goal):
+        if not _AbstractCmd._locked_send_goal(robot, sequence_client, sequence_action_goal):
             rospy.logdebug("Command was paused before goal could be send.")
             return robot._STOPPED
         rospy.logdebug("Wait till motion finished...")
-        done = robot._sequence_client.wait_for_result()
+        done = sequence_client.wait_for_result()
         rospy.logdebug("Function wait_for_result() of command finished.")
         assert done is True, "Function wait_for_result() is finished but the goal is not done."
 
-        result_code = robot._sequence_client.get_result()
+        result_code = sequence_client.get_result()
         if result_code is None: # pragma: no cover  Paranoia-check should actually never happen.
             rospy.logerr("No result received from action server.")
             return robot._FAILURE
@@ -731,7 +733,8 @@ def _to_robot_reference(robot, pose_frame, goal_pose_custom_ref):
     stamped = PoseStamped()
     stamped.header.frame_id = pose_frame
     stamped.pose = goal_pose_custom_ref
-    return robot.tf_listener_.transformPose(robot_ref, stamped).pose
+    transform = robot._tf_buffer.lookup_transform(robot_ref, pose_frame, rospy.Time(0))
+    return do_transform_pose(stamped, transform).pose
 
 
 def _to_ori_constraint(pose, reference_frame, link_name, orientation_tolerance=_DEFAULT_ORIENTATION_TOLERANCE):
@@ -95,8 +95,9 @@ class _MoveControlStateMachine(object):
         assert isinstance(action, MoveControlAction), \
             "Unknown type of action, only MoveControlAction is allowed."
         with self._state_lock:
-            rospy.loginfo("Switching state from " + self.__state.name + " to " + self._fsm[(self.__state, action)].name)
-            self.__state = self._fsm[(self.__state, action)]
+            next_state = self._fsm[(self.__state, action)]
+            rospy.loginfo("Switching state from %s to %s", self.__state.name, next_state.name)
+            self.__state = next_state
             self._state_cv.notify_all()
 
     def wait_for_resume(self):
@@ -22,19 +22,37 @@ from pilz_msgs.msg import MoveGroupSequenceAction
 from actionlib import SimpleActionClient, GoalStatus
 from moveit_commander import RobotCommander, MoveItCommanderException
 from moveit_msgs.msg import MoveItErrorCodes, MoveGroupAction
+import os
 import time
-import threading
 from std_srvs.srv import Trigger
-import tf
+import tf2_ros
 
 from .move_control_request import _MoveControlState, MoveControlAction,_MoveControlStateMachine
 from .commands import _AbstractCmd, _DEFAULT_PLANNING_GROUP, _DEFAULT_TARGET_LINK
 from .exceptions import *
-from geometry_msgs.msg import Quaternion, PoseStamped, Pose
-from std_msgs.msg import Header
+from geometry_msgs.msg import Pose, Point
 
 __version__ = '1.0.0'
 
+# Return values of the command execution, also available as Robot._SUCCESS, Robot._STOPPED and Robot._FAILURE
+# Command finished successfully
+_SUCCESS = 1
+# Command was stopped; Value based on Moveit error code for preempted
+_STOPPED = -7
+# Something went wrong while executing the command
+_FAILURE = 99999
+
+# Move control states used in the move execution loop
+_NO_REQUEST = _MoveControlState.NO_REQUEST
+_STOP_REQUESTED = _MoveControlState.STOP_REQUESTED
+_PAUSE_REQUESTED = _MoveControlState.PAUSE_REQUESTED
+_RESUME_REQUESTED = _MoveControlState.RESUME_REQUESTED
+
+# Time stamp to look up the latest available transform
+_LATEST_TIME = rospy.Time(0)
+# Timeout when waiting for a transform
+_TF_TIMEOUT = rospy.Duration(5, 0)
+
 
 class Robot(object):
     """
@@ -66,8 +84,10 @@ class Robot(object):
         * sequence_move_group
 
     :note:
-        Currently the API does not support creating a new instance of :py:class:`.Robot` after deleting an old one in the
-        same program. However this can be realized by calling :py:meth:`_release` before the deletion.
+        The resources of a :py:class:`.Robot` instance are released when ROS shuts down, deleting the instance does
+        not release them. Currently the API does not support creating a new instance of :py:class:`.Robot` after
+        deleting an old one in the same program. However this can be realized by calling :py:meth:`_release` before
+        the deletion.
 
     :param version:
         To ensure that always the correct API version is used, it is necessary to state
@@ -84,11 +104,18 @@ class Robot(object):
     # ++++++++++++++++++++++++++
 
     # Command finished successfully
-    _SUCCESS = 1
+    _SUCCESS = _SUCCESS
     # Command was stopped; Value based on Moveit error code for preempted
-    _STOPPED = -7
+    _STOPPED = _STOPPED
     # Something went wrong while executing the command
-    _FAILURE = 99999
+    _FAILURE = _FAILURE
+
+    # Maps Moveit error codes to return values, all other error codes are mapped to _FAILURE
+    _ERROR_CODE_MAP = {MoveItErrorCodes.SUCCESS: _SUCCESS, MoveItErrorCodes.PREEMPTED: _STOPPED}
+
+    # Actions automatically triggered at the start of move depending on the move control state
+    _MOVE_START_ACTION_MAP = {_STOP_REQUESTED: MoveControlAction.MOTION_STOPPED,
+                              _RESUME_REQUESTED: MoveControlAction.MOTION_RESUMED}
 
     # Topic names
     _PAUSE_TOPIC_NAME = "pause_movement"
@@ -100,22 +127,39 @@ class Robot(object):
     def __init__(self, version=None):
         rospy.logdebug("Initialize Robot Api.")
 
-        # tf listener is necessary for pose transformation
+        # tf buffer (filled by the tf listener) is necessary for pose transformation
         # when using custom reference frames.
-        self.tf_listener_ = tf.TransformListener()
+        self._tf_buffer = tf2_ros.Buffer()
+        self._tf_listener = tf2_ros.TransformListener(self._tf_buffer)
 
-        self._move_lock = threading.Lock()
+        # Frame pairs (target_link, base) whose transform has already been available once
+        self._warm_frame_pairs = set()
 
         # manage the move control request
         self._move_ctrl_sm = _MoveControlStateMachine()
 
+        # Flag indicating that move is running, guarded by the lock of the move control state machine.
+        self._move_busy = False
+
+        # Execute functions of the already moved command types (command type -> execute function)
+        self._execute_dispatch = {}
+
         self._ctor_exception_flag = False
 
+        # identifies this instance as owner of the single instance flag
+        self._single_instance_token = None
+
         self._check_version(version)
 
         self._check_single_instance()
 
-        self._establish_connections()
+        try:
+            self._establish_connections()
+        except BaseException:
+            # Shutdown the already started services and delete the single instance flag, otherwise no
+            # further instance could be created. Also done on KeyboardInterrupt while waiting for the server.
+            self._release()
+            raise
 
         # We use this auxiliary member to implement a lazy initialization
         # for the '_robot_commander' member. The lazy initialization
@@ -160,16 +204,29 @@ class Robot(object):
         :rtype: geometry_msgs.msg.Pose
         :raises RobotCurrentStateError if the pose of the given frame is not known
         """
-
-        try:
-            self.tf_listener_.waitForTransform(target_link, base, rospy.Time(), rospy.Duration(5, 0))
-            orientation_ = Quaternion(0, 0, 0, 1)
-            stamped = PoseStamped(header=Header(frame_id=target_link), pose=Pose(orientation=orientation_))
-            current_pose = self.tf_listener_.transformPose(base, stamped).pose
-            return current_pose
-        except tf.Exception as e:
-            rospy.logerr(e.message)
-            raise RobotCurrentStateError(e.message)
+        frame_pair = (target_link, base)
+        transform = None
+        if frame_pair in self._warm_frame_pairs:
+            # the transform was available before, so it is looked up without waiting
+            try:
+                transform = self._tf_buffer.lookup_transform(base, target_link, _LATEST_TIME)
+            except tf2_ros.TransformException:
+                self._warm_frame_pairs.discard(frame_pair)
+
+        if transform is None:
+            try:
+                transform = self._tf_buffer.lookup_transform(base, target_link, _LATEST_TIME, _TF_TIMEOUT)
+            except tf2_ros.TransformException as e:
+                rospy.logerr(e.message)
+                raise RobotCurrentStateError(e.message)
+            self._warm_frame_pairs.add(frame_pair)
+
+        # the pose of target link in the base frame equals the transform from target link to base
+        translation = transform.transform.translation
+        current_pose = Pose(position=Point(translation.x, translation.y, translation.z),
+                            orientation=transform.transform.rotation)
+
+        return current_pose
 
     def move(self, cmd):
         """ Allows the user to start/execute robot motion commands.
@@ -196,30 +253,35 @@ class Robot(object):
             ends immediately. An exception is thrown instead of returning an error
             to ensure that no further robot motion commands are executed.
         """
-        # Check command type
-        if not isinstance(cmd, _AbstractCmd):
-            rospy.logerr("Unknown command type.")
-            raise RobotUnknownCommandType("Unknown command type.")
+        # Check command type, each command type is only checked once
+        cmd_type = type(cmd)
+        execute = self._execute_dispatch.get(cmd_type)
+        if execute is None:
+            if not issubclass(cmd_type, _AbstractCmd):
+                rospy.logerr("Unknown command type.")
+                raise RobotUnknownCommandType("Unknown command type.")
+            execute = cmd_type._execute
+            self._execute_dispatch[cmd_type] = execute
 
         # Check that move is not called by multiple threads in parallel.
-        if not self._move_lock.acquire(False):
-            raise RobotMoveAlreadyRunningError("Parallel calls to move are note allowed.")
+        with self._move_ctrl_sm:
+            if self._move_busy:
+                raise RobotMoveAlreadyRunningError("Parallel calls to move are note allowed.")
+            self._move_busy = True
 
-        rospy.loginfo("Move: " + cmd.__class__.__name__)
-        rospy.logdebug("Move: " + str(cmd))
+        rospy.loginfo("Move: %s", cmd.__class__.__name__)
+        rospy.logdebug("Move: %s", cmd)
 
-        # automatic transition from STOP_REQUESTED to NO_REQUEST when move is called
-        if self._move_ctrl_sm.state == _MoveControlState.STOP_REQUESTED:
-            self._move_ctrl_sm.switch(MoveControlAction.MOTION_STOPPED)
-
-        # automatic transition from RESUME_REQUESTED to NO_REQUEST when move is called
-        if self._move_ctrl_sm.state == _MoveControlState.RESUME_REQUESTED:
-            self._move_ctrl_sm.switch(MoveControlAction.MOTION_RESUMED)
+        # automatic transition from STOP_REQUESTED or RESUME_REQUESTED to NO_REQUEST when move is called
+        state = self._move_ctrl_sm.state
+        if state in self._MOVE_START_ACTION_MAP:
+            self._move_ctrl_sm.switch(self._MOVE_START_ACTION_MAP[state])
 
         try:
-            self._move_execution_loop(cmd)
+            self._move_execution_loop(cmd, execute)
         finally:
-            self._move_lock.release()
+            with self._move_ctrl_sm:
+                self._move_busy = False
 
     def stop(self):
         """The stop function allows the user to cancel the currently running robot motion command and . This is also
@@ -259,7 +321,8 @@ class Robot(object):
         rospy.loginfo("Resume called.")
         self._move_ctrl_sm.switch(MoveControlAction.RESUME)
 
-    def _move_execution_loop(self, cmd):
+    def _move_execution_loop(self, cmd, execute):
+        move_ctrl_sm = self._move_ctrl_sm
 
         continue_execution_of_cmd = True
         first_iteration_flag = True
@@ -267,35 +330,37 @@ class Robot(object):
         while continue_execution_of_cmd:
             rospy.logdebug("Move execution loop.")
 
+            # the state is read again after each call which might change it
+            state = move_ctrl_sm.state
+
             # execute
-            if ((self._move_ctrl_sm.state == _MoveControlState.NO_REQUEST and first_iteration_flag)
-                or self._move_ctrl_sm.state == _MoveControlState.RESUME_REQUESTED) \
-                    and continue_execution_of_cmd:
+            if (state == _NO_REQUEST and first_iteration_flag) or state == _RESUME_REQUESTED:
                 rospy.logdebug("start execute")
 
                 # automatic switch to no request
-                if self._move_ctrl_sm.state == _MoveControlState.RESUME_REQUESTED:
-                    self._move_ctrl_sm.switch(MoveControlAction.MOTION_RESUMED)
+                if state == _RESUME_REQUESTED:
+                    move_ctrl_sm.switch(MoveControlAction.MOTION_RESUMED)
 
-                execution_result = cmd._execute(self)
+                execution_result = execute(cmd, self)
+                state = move_ctrl_sm.state
 
                 # evaluate the result of execute
                 # motion preempt
-                if execution_result == Robot._STOPPED:
-                    # need to wait for resume, or execute the motion again
-                    if self._move_ctrl_sm.state == _MoveControlState.PAUSE_REQUESTED \
-                            or self._move_ctrl_sm.state == _MoveControlState.RESUME_REQUESTED:
+                if execution_result == _STOPPED:
+                    # execute the motion again
+                    if state == _RESUME_REQUESTED:
                         continue
                     # external stop
-                    elif self._move_ctrl_sm.state == _MoveControlState.NO_REQUEST:
+                    elif state == _NO_REQUEST:
                         rospy.logerr("External stop of move command")
                         raise RobotMoveFailed("External stop of move command")
                     # normal stop
-                    else:
+                    elif state == _STOP_REQUESTED:
                         rospy.logerr("Execution of move command is stopped")
                         raise RobotMoveFailed("Execution of move command is stopped")
+                    # pause, directly wait for resume below
                 # motion succeeded
-                elif execution_result == Robot._SUCCESS:
+                elif execution_result == _SUCCESS:
                     continue_execution_of_cmd = False
                 # motion failed
                 else:
@@ -303,25 +368,19 @@ class Robot(object):
                     raise RobotMoveFailed("Failure during execution of: " + str(cmd))
 
             # pause
-            if self._move_ctrl_sm.state == _MoveControlState.PAUSE_REQUESTED:
+            if state == _PAUSE_REQUESTED:
                 rospy.loginfo("start wait for resume")
-                self._move_ctrl_sm.wait_for_resume()
+                move_ctrl_sm.wait_for_resume()
+                state = move_ctrl_sm.state
 
             # stop
-            if self._move_ctrl_sm.state == _MoveControlState.STOP_REQUESTED:
+            if state == _STOP_REQUESTED:
                 rospy.logerr("Execution of move command is stopped")
                 raise RobotMoveFailed("Execution of move command is stopped")
 
             first_iteration_flag = False
 
     def _on_shutdown(self):
-        def delete_param(key):
-            if rospy.has_param(key):
-                rospy.logdebug("Delete parameter " + key + " from parameter server.")
-                rospy.delete_param(key)
-        # deletes the single instance parameter when interpreter terminates
-        delete_param(self._SINGLE_INSTANCE_FLAG)
-
         with self._move_ctrl_sm: # wait, if _execute is just starting a send_goal()
             actionclient_state = self._sequence_client.get_state()
         # stop movement
@@ -329,8 +388,12 @@ class Robot(object):
             self._sequence_client.cancel_goal()
             self._sequence_client.wait_for_result(timeout = rospy.Duration(2.))
 
+        # shutdown services and delete the single instance parameter when ros terminates
+        self._release()
+
     def _cancel_on_all_clients(self):
-        self._sequence_client.cancel_goal()
+        for client in self._action_clients:
+            client.cancel_goal()
 
     def _pause_service_callback(self, request):
         self.pause()
@@ -346,12 +409,7 @@ class Robot(object):
 
     def _map_error_code(self, moveit_error_code):
         """Maps the given Moveit error code to API specific return values."""
-        if moveit_error_code.val == MoveItErrorCodes.SUCCESS:
-            return self._SUCCESS
-        elif moveit_error_code.val == MoveItErrorCodes.PREEMPTED:
-            return self._STOPPED
-        else:
-            return self._FAILURE
+        return self._ERROR_CODE_MAP.get(moveit_error_code.val, self._FAILURE)
 
     def _check_version(self, version):
         # check if version is set by user
@@ -369,24 +427,50 @@ class Robot(object):
                                     "Current installed version is " + __version__ + "!")
 
     def _check_single_instance(self):
-        # If running the same program twice the second should kill the first, however the parameter server
-        # has a small delay so we check twice for the single instance flag.
-        if rospy.has_param(self._SINGLE_INSTANCE_FLAG):
-            time.sleep(1)
+        token = {"node": rospy.get_name(), "pid": os.getpid(), "time": time.time()}
 
-        if rospy.has_param(self._SINGLE_INSTANCE_FLAG) and rospy.get_param(self._SINGLE_INSTANCE_FLAG):
+        owner = rospy.get_param(self._SINGLE_INSTANCE_FLAG, None)
+        if owner and not self._is_replaced_instance(owner, token):
             rospy.logerr("An instance of Robot class already exists.")
             self._ctor_exception_flag = True
             raise RobotMultiInstancesError("Only one instance of Robot class can be created!")
-        else:
-            rospy.set_param(self._SINGLE_INSTANCE_FLAG, True)
+
+        rospy.set_param(self._SINGLE_INSTANCE_FLAG, token)
+
+        # Re-read the flag to detect another instance which has set the flag in parallel. This is no atomic
+        # compare-and-set, it only narrows the race between parallel instantiations.
+        if rospy.get_param(self._SINGLE_INSTANCE_FLAG, None) != token:
+            rospy.logerr("An instance of Robot class already exists.")
+            self._ctor_exception_flag = True
+            raise RobotMultiInstancesError("Only one instance of Robot class can be created!")
+
+        self._single_instance_token = token
+
+    @staticmethod
+    def _is_replaced_instance(owner, token):
+        # If running the same program twice the second should kill the first. The ROS master shuts down the first
+        # node because of the duplicated node name, so its flag can be taken over without waiting for the deletion.
+        return isinstance(owner, dict) and owner.get("node") == token["node"] and owner.get("pid") != token["pid"]
+
+    def _delete_single_instance_flag(self):
+        # The flag might have been taken over by a new instance, in this case it must not be deleted.
+        if self._single_instance_token is not None \
+                and rospy.get_param(self._SINGLE_INSTANCE_FLAG, None) == self._single_instance_token:
+            try:
+                rospy.delete_param(self._SINGLE_INSTANCE_FLAG)
+                rospy.logdebug("Deleted single instance parameter from parameter server.")
+            except KeyError:
+                # already deleted in the meantime
+                pass
 
     def _establish_connections(self):
         # Create sequence_move_group client, only for manipulator
         self._sequence_client = SimpleActionClient(self._SEQUENCE_TOPIC, MoveGroupSequenceAction)
-        rospy.loginfo("Waiting for connection to action server " + self._SEQUENCE_TOPIC + "...")
+        # all action clients which have to be cancelled on pause and stop
+        self._action_clients = [self._sequence_client]
+        rospy.loginfo("Waiting for connection to action server %s...", self._SEQUENCE_TOPIC)
         self._sequence_client.wait_for_server()
-        rospy.logdebug("Connection to action server " + self._SEQUENCE_TOPIC + " established.")
+        rospy.logdebug("Connection to action server %s established.", self._SEQUENCE_TOPIC)
 
         # Start ROS Services which allow to pause, resume and stop movements
         self._pause_service = rospy.Service(Robot._PAUSE_TOPIC_NAME, Trigger, self._pause_service_callback)
@@ -403,9 +487,4 @@ class Robot(object):
             rospy.logdebug("Services do not exists yet or have already been shutdown.")
         # if robot is not created successfully, do not change the flag
         if not self._ctor_exception_flag:
-            rospy.logdebug("Delete single instance parameter from parameter server.")
-            rospy.delete_param(self._SINGLE_INSTANCE_FLAG)
-
-    def __del__(self):
-        rospy.logdebug("Dtor called")
-        self._release()
+            self._delete_single_instance_flag()
@@ -14,7 +14,9 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
 import unittest
+import rospy
 from pilz_robot_programming.robot import *
 
 PLANNING_GROUP_NAME = "manipulator"
@@ -41,7 +43,7 @@ class TestAPIInstantiation(unittest.TestCase):
         except RobotVersionError:
             pass
         else:
-            del r
+            r._release()
             self.fail('Robot instance can be created with wrong version.')
 
     def test_none_version(self):
@@ -59,7 +61,7 @@ class TestAPIInstantiation(unittest.TestCase):
         except RobotVersionError:
             pass
         else:
-            del r
+            r._release()
             self.fail('Robot instance can be created with wrong version.')
 
     def test_multiple_instances(self):
@@ -75,11 +77,81 @@ class TestAPIInstantiation(unittest.TestCase):
         try:
             r2 = Robot(API_VERSION)
         except RobotMultiInstancesError:
-            del r1
+            r1._release()
         else:
-            del r1, r2
+            r1._release()
+            r2._release()
             self.fail('Multiple robot instances does not throw exception.')
 
+    def test_instance_of_other_node(self):
+        """ Check that an instance of Robot can not be created while another node owns the single instance flag.
+
+            Test sequence:
+                1. Set the single instance flag of another node.
+                2. Create robot instance.
+
+            Test Results:
+                1. -
+                2. Creation failed with RobotMultiInstancesError.
+        """
+        other_token = {"node": "/other_node", "pid": os.getpid() + 1, "time": 0.0}
+        rospy.set_param(Robot._SINGLE_INSTANCE_FLAG, other_token)
+        try:
+            self.assertRaises(RobotMultiInstancesError, Robot, API_VERSION)
+            self.assertEqual(other_token, rospy.get_param(Robot._SINGLE_INSTANCE_FLAG))
+        finally:
+            rospy.delete_param(Robot._SINGLE_INSTANCE_FLAG)
+
+    def test_takeover_of_replaced_instance(self):
+        """ Check that the single instance flag of a replaced node (same node name, other process) is taken over.
+
+            Test sequence:
+                1. Set the single instance flag of another process with the node name of this node.
+                2. Create robot instance.
+                3. Release robot instance.
+
+            Test Results:
+                1. -
+                2. Creation succeeds and the flag is owned by the new instance.
+                3. The flag is deleted.
+        """
+        replaced_token = {"node": rospy.get_name(), "pid": os.getpid() + 1, "time": 0.0}
+        rospy.set_param(Robot._SINGLE_INSTANCE_FLAG, replaced_token)
+        try:
+            r = Robot(API_VERSION)
+        except RobotMultiInstancesError:
+            rospy.delete_param(Robot._SINGLE_INSTANCE_FLAG)
+            self.fail('Single instance flag of replaced instance is not taken over.')
+
+        try:
+            self.assertEqual(r._single_instance_token, rospy.get_param(Robot._SINGLE_INSTANCE_FLAG))
+        finally:
+            r._release()
+        self.assertFalse(rospy.has_param(Robot._SINGLE_INSTANCE_FLAG))
+
+    def test_release_keeps_flag_of_other_instance(self):
+        """ Check that releasing an instance does not delete a single instance flag it does not own.
+
+            Test sequence:
+                1. Create robot instance.
+                2. Overwrite the single instance flag with the one of another instance.
+                3. Release robot instance.
+
+            Test Results:
+                1. -
+                2. -
+                3. The flag of the other instance still exists.
+        """
+        r = Robot(API_VERSION)
+        other_token = {"node": "/other_node", "pid": os.getpid() + 1, "time": 0.0}
+        rospy.set_param(Robot._SINGLE_INSTANCE_FLAG, other_token)
+
+        r._release()
+        try:
+            self.assertEqual(other_token, rospy.get_param(Robot._SINGLE_INSTANCE_FLAG, None))
+        finally:
+            rospy.delete_param(Robot._SINGLE_INSTANCE_FLAG)
+
 
 if __name__ == '__main__':
     import rostest
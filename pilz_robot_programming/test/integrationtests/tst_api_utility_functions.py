@@ -19,6 +19,7 @@ from rospkg import RosPack
 from pilz_robot_programming.robot import *
 from pilz_industrial_motion_testutils.xml_testdata_loader import *
 from pilz_robot_programming.commands import *
+from geometry_msgs.msg import TransformStamped
 
 _TEST_DATA_FILE_NAME = RosPack().get_path("pilz_industrial_motion_testutils") + "/test_data/testdata.xml"
 PLANNING_GROUP_NAME = "manipulator"
@@ -26,6 +27,20 @@ API_VERSION = "1"
 COMPARE_PRECISION = 6
 
 
+class StaticTfBufferMock(object):
+    """Mock of the tf buffer returning a static transform (no time stamp) with a settable translation."""
+    def __init__(self):
+        self.translation_x = 0.1
+
+    def lookup_transform(self, target_frame, source_frame, time, timeout=None):
+        transform = TransformStamped()
+        transform.header.frame_id = target_frame
+        transform.child_frame_id = source_frame
+        transform.transform.translation.x = self.translation_x
+        transform.transform.rotation.w = 1.0
+        return transform
+
+
 class TestAPIUtilityFunctions(unittest.TestCase):
     """
     Test utility functions in the python api.
@@ -78,6 +93,33 @@ class TestAPIUtilityFunctions(unittest.TestCase):
         """
         self.assertRaises(RobotCurrentStateError, self.robot.get_current_pose, target_link="invalid")
 
+    def test_get_current_pose_of_republished_static_frames(self):
+        """ Check that the current pose reflects a static transform which is published again with a new value
+
+            Test sequence:
+                1. Replace the tf buffer by a mock returning static transforms.
+                2. Get the current pose of a frame pair.
+                3. Change the static transform and get the current pose again.
+
+            Test Results:
+                1. -
+                2. The pose has the values of the transform.
+                3. The pose has the values of the changed transform.
+        """
+        # 1
+        tf_buffer_mock = StaticTfBufferMock()
+        self.robot._tf_buffer = tf_buffer_mock
+
+        # 2
+        first_pose = self.robot.get_current_pose(target_link="static_link", base="static_base")
+        self.assertAlmostEqual(0.1, first_pose.position.x, COMPARE_PRECISION)
+
+        # 3
+        tf_buffer_mock.translation_x = 0.5
+        second_pose = self.robot.get_current_pose(target_link="static_link", base="static_base")
+        self.assertAlmostEqual(0.5, second_pose.position.x, COMPARE_PRECISION)
+        self.assertAlmostEqual(1.0, second_pose.orientation.w, COMPARE_PRECISION)
+
     def test_get_current_joints(self):
         """ Check if the current joints can be retrieved correctly
 